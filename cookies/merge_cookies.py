@@ -7,30 +7,36 @@ Intelligently merges YouTube and YouTube Music cookie files
 import os
 import sys
 from pathlib import Path
-from typing import Dict, Set, List, Tuple
+from typing import Dict, Set, List, Optional, Tuple
 from datetime import datetime
 
-def parse_cookie_line(line: str) -> Tuple[str, Dict]:
-    """Parse a single cookie line into key components"""
-    parts = line.strip().split('\t')
+# Header written at the top of the merged cookie file
+HEADER_TMPL = (
+    "# Netscape HTTP Cookie File\n"
+    "# https://curl.haxx.se/rfc/cookie_spec.html\n"
+    "# This is a generated file! Do not edit.\n"
+    "#\n"
+    "# Combined YouTube & YouTube Music Cookie File\n"
+    "# Intelligently merged with preference for newer cookies\n"
+    "# Generated: {ts}\n"
+    "#\n"
+    "\n"
+)
+
+def parse_cookie_line(line: str) -> Optional[Tuple[str, str, int, int, str]]:
+    """Parse an already-stripped cookie line into (domain, name, expiration, value_len, raw_line)"""
+    parts = line.split('\t', 7)
     if len(parts) < 7:
-        return None, {}
+        return None
     
-    return {
-        'domain': parts[0],
-        'flag': parts[1] == 'TRUE',
-        'path': parts[2], 
-        'secure': parts[3] == 'TRUE',
-        'expiration': int(parts[4]) if parts[4] != '0' else 0,
-        'name': parts[5],
-        'value': parts[6],
-        'raw_line': line.strip()
-    }
+    expiration = int(parts[4]) if parts[4] != '0' else 0
+    return (parts[0], parts[5], expiration, len(parts[6]), line)
 
 def merge_cookie_files(youtube_file: Path, music_file: Path, output_file: Path):
     """Intelligently merge cookie files, preferring newer cookies"""
     
-    cookies = {}  # key: (domain, name) -> cookie_dict
+    cookies = {}  # key: (domain, name) -> (precedence, raw_line)
+    domains: Set[str] = set()
     
     files_to_process = []
     if youtube_file.exists():
@@ -43,68 +49,54 @@ def merge_cookie_files(youtube_file: Path, music_file: Path, output_file: Path):
     for source_name, file_path in files_to_process:
         print(f"  Reading {source_name}: {file_path.name}")
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
         cookie_count = 0
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-                
-            cookie = parse_cookie_line(line)
-            if not cookie:
-                continue
-            
-            key = (cookie['domain'], cookie['name'])
-            
-            # If we already have this cookie, prefer the one with later expiration
-            if key in cookies:
-                existing = cookies[key]
+        # Iterate the file object directly so lines are streamed from the buffer
+        with open(file_path, 'r', encoding='utf-8', buffering=1 << 16) as f:
+            for raw in f:
+                line = raw.strip()
+                if not line or line[0] == '#':
+                    continue
+                    
+                cookie = parse_cookie_line(line)
+                if not cookie:
+                    continue
                 
-                # Prefer non-zero expiration over zero expiration
-                if existing['expiration'] == 0 and cookie['expiration'] > 0:
-                    cookies[key] = cookie
-                elif cookie['expiration'] == 0 and existing['expiration'] > 0:
-                    pass  # Keep existing
-                elif cookie['expiration'] > existing['expiration']:
-                    cookies[key] = cookie
-                # If same expiration, prefer longer value (often more recent)
-                elif cookie['expiration'] == existing['expiration']:
-                    if len(cookie['value']) > len(existing['value']):
-                        cookies[key] = cookie
-            else:
-                cookies[key] = cookie
+                domain, name, expiration, value_len, raw_line = cookie
+                key = (domain, name)
+                # Precedence: prefer non-zero expiration over zero expiration,
+                # then later expiration, then longer value (often more recent)
+                entry = ((expiration > 0, expiration, value_len), raw_line)
                 
-            cookie_count += 1
+                # Insert new cookies with a single lookup; only a real collision
+                # (possible even within one file) needs conflict resolution
+                existing = cookies.setdefault(key, entry)
+                if existing is entry:
+                    domains.add(domain)
+                elif entry[0] > existing[0]:
+                    cookies[key] = entry
+                    
+                cookie_count += 1
         
         print(f"    Found {cookie_count} cookies")
     
     # Write combined file
     print(f"Writing combined file: {output_file}")
     
-    with open(output_file, 'w', encoding='utf-8') as f:
+    with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
         # Write header
-        f.write("# Netscape HTTP Cookie File\n")
-        f.write("# https://curl.haxx.se/rfc/cookie_spec.html\n") 
-        f.write("# This is a generated file! Do not edit.\n")
-        f.write("#\n")
-        f.write("# Combined YouTube & YouTube Music Cookie File\n")
-        f.write("# Intelligently merged with preference for newer cookies\n")
-        f.write(f"# Generated: {datetime.now().isoformat()}\n")
-        f.write("#\n")
-        f.write("\n")
+        f.write(HEADER_TMPL.format(ts=datetime.now().isoformat()))
         
         # Sort cookies by domain, then by name
-        sorted_cookies = sorted(cookies.values(), key=lambda x: (x['domain'], x['name']))
+        sorted_cookies = sorted(cookies.items(), key=lambda item: item[0])
         
-        for cookie in sorted_cookies:
-            f.write(cookie['raw_line'] + '\n')
+        # Emit all cookie lines in a single buffered write
+        if sorted_cookies:
+            f.write('\n'.join(raw_line for _, (_, raw_line) in sorted_cookies))
+            f.write('\n')
     
     print(f"Successfully merged {len(cookies)} unique cookies")
     
     # Show domains
-    domains = set(cookie['domain'] for cookie in cookies.values())
     print(f"Domains included: {sorted(domains)}")
     
     return len(cookies)
@@ -9,31 +9,99 @@ This version doesn't require FFmpeg to be in PATH for the metadata fetch.
 
 import sys
 import os
+import socket
 import subprocess
 import json
+import threading
+import re
 import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Use orjson for faster response parsing when it is installed
+try:
+    import orjson as json_lib
+except ImportError:
+    json_lib = json
+
 # Force UTF-8 encoding for stdout/stderr to handle emojis on Windows
 if sys.platform == "win32":
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
+# Audio file extensions yt-dlp may produce without conversion
+AUDIO_EXTS = ('.webm', '.m4a', '.opus', '.mp3', '.aac')
+
+# Upper bound on a whole yt-dlp run, in-process or as a subprocess
+YTDLP_TIMEOUT = 180
+
+# oEmbed title formats, tried in order of precedence. Each alternative
+# captures the text before the first separator and up to the next one.
+TITLE_RE = re.compile(
+    r'(?P<quoted>.*?)" - (?P<quoted_artist>.*?)(?:" - |\Z)'
+    r'|(?P<dashed>.*?) - (?P<dashed_artist>.*?)(?: - |\Z)'
+    r'|(?P<by>.*?) by (?P<by_artist>.*?)(?: by |\Z)',
+    re.DOTALL
+)
+
+# Shared opener so handler setup is done once for all metadata requests
+HTTP_OPENER = urllib.request.build_opener()
+
+# On-disk cache of track metadata, keyed by Spotify track ID
+TRACK_CACHE_FILE = Path.home() / '.cache' / 'song-downloader' / 'track_meta.json'
+
+def extract_track_id(spotify_url):
+    """Extract the Spotify track ID from a track URL or URI"""
+    if "/track/" in spotify_url:
+        return spotify_url.split("/track/")[1].split("?")[0]
+    elif "spotify:track:" in spotify_url:
+        return spotify_url.split("spotify:track:")[1]
+    return None
+
+def load_track_cache():
+    """Load cached track metadata, returning an empty dict if unavailable"""
+    try:
+        with open(TRACK_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_track_cache(cache):
+    """Atomically write the track metadata cache back to disk"""
+    try:
+        TRACK_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = TRACK_CACHE_FILE.with_suffix('.json.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(temp_path, TRACK_CACHE_FILE)
+    except OSError as e:
+        print(f"Failed to write track cache: {e}", file=sys.stderr)
+
+TRACK_CACHE = load_track_cache()
+
+def api_available():
+    """Quickly check whether the local API is accepting connections"""
+    try:
+        socket.create_connection(('localhost', 3000), timeout=0.05).close()
+        return True
+    except OSError:
+        print("Local API is not reachable, skipping it", file=sys.stderr)
+        return False
+
 def extract_track_info_from_api(spotify_url):
     """
     Extract track info using the local API endpoint (which uses Spotify Web API).
     This gives us accurate track and artist names for better YouTube search.
     """
     try:
-        import urllib.request
-        import json as json_lib
-        
         # Call our local API endpoint
         api_url = f"http://localhost:3000/api/spotify/track-metadata?url={urllib.parse.quote(spotify_url)}"
         
-        with urllib.request.urlopen(api_url, timeout=15) as response:
-            data = json_lib.loads(response.read().decode('utf-8'))
+        with HTTP_OPENER.open(api_url, timeout=15) as response:
+            data = json_lib.loads(response.read())
             
             if 'error' in data:
                 print(f"API error: {data['error']}", file=sys.stderr)
@@ -56,26 +124,17 @@ def extract_track_info_from_url(spotify_url):
     Extract basic info from Spotify URL without using spotdl.
     Uses Spotify's oEmbed API (no auth required) as fallback.
     """
-    track_id = None
-    
-    # Extract track ID from URL
-    if "/track/" in spotify_url:
-        track_id = spotify_url.split("/track/")[1].split("?")[0]
-    elif "spotify:track:" in spotify_url:
-        track_id = spotify_url.split("spotify:track:")[1]
+    track_id = extract_track_id(spotify_url)
     
     if not track_id:
         return None
     
     try:
-        import urllib.request
-        import json as json_lib
-        
         # Use Spotify's oEmbed API (public, no auth needed)
         oembed_url = f"https://open.spotify.com/oembed?url=https://open.spotify.com/track/{track_id}"
         
-        with urllib.request.urlopen(oembed_url, timeout=10) as response:
-            data = json_lib.loads(response.read().decode('utf-8'))
+        with HTTP_OPENER.open(oembed_url, timeout=10) as response:
+            data = json_lib.loads(response.read())
             
             # Parse title - Try different formats
             # Spotify oEmbed returns formats like:
@@ -88,24 +147,20 @@ def extract_track_info_from_url(spotify_url):
             track_name = 'Unknown'
             artist = 'Unknown Artist'
             
-            if '" - ' in title:
+            match = TITLE_RE.match(title)
+            if match is None:
+                # Use whole title
+                track_name = title
+            elif match['quoted'] is not None:
                 # Format: "Song Name" - Artist Name
-                parts = title.split('" - ')
-                track_name = parts[0].strip('"')
-                artist = parts[1] if len(parts) > 1 else 'Unknown Artist'
-            elif ' - ' in title:
+                track_name = match['quoted'].strip('"')
+                artist = match['quoted_artist']
+            elif match['dashed'] is not None:
                 # Format: Song Name - Artist Name
-                parts = title.split(' - ')
-                track_name = parts[0]
-                artist = parts[1] if len(parts) > 1 else 'Unknown Artist'
-            elif ' by ' in title:
-                # Format: Song Name by Artist Name
-                parts = title.split(' by ')
-                track_name = parts[0]
-                artist = parts[1] if len(parts) > 1 else 'Unknown Artist'
+                track_name, artist = match['dashed'], match['dashed_artist']
             else:
-                # Use whole title
-                track_name = title
+                # Format: Song Name by Artist Name
+                track_name, artist = match['by'], match['by_artist']
             
             return {
                 'name': track_name,
@@ -116,12 +171,126 @@ def extract_track_info_from_url(spotify_url):
         print(f"Failed to fetch from Spotify oEmbed: {e}", file=sys.stderr)
         return None
 
-def download_with_ytdlp(search_query, output_dir, use_consistent_naming=False):
+def warmup_ytdlp(use_subprocess=False):
+    """Load yt-dlp ahead of time so it is ready before the real download"""
+    try:
+        if use_subprocess:
+            subprocess.run(
+                [sys.executable, '-m', 'yt_dlp', '--version'],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=30
+            )
+        else:
+            import yt_dlp  # noqa: F401
+    except Exception:
+        pass
+
+def run_ytdlp_in_process(music_search_url, output_template):
+    """
+    Download with the yt_dlp Python API, avoiding interpreter startup cost.
+    Returns (downloaded_path, error_details).
+    """
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import DownloadError
+    
+    ydl_opts = {
+        'format': 'bestaudio[ext=m4a]/bestaudio',  # Prefer m4a (better quality than webm)
+        'outtmpl': output_template,
+        'nopostoverwrites': True,
+        'noplaylist': True,  # Don't download playlists (in case URL is a playlist)
+        'playlist_items': '1',  # Only download first result
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 30,  # Fail stalled connections instead of waiting forever
+    }
+    
+    def _run():
+        try:
+            with YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(music_search_url, download=True)
+                # A search with no hits comes back as a playlist with no entries
+                if info and 'entries' in info:
+                    info = info['entries'][0] if info['entries'] else None
+                if not info:
+                    return None, 'No results found'
+                
+                # Prefer the final (post-processed) path reported by yt-dlp
+                requested = info.get('requested_downloads') or []
+                if requested and requested[0].get('filepath'):
+                    downloaded_path = requested[0]['filepath']
+                else:
+                    downloaded_path = ydl.prepare_filename(info)
+                if not os.path.exists(downloaded_path):
+                    return None, 'Downloaded file not found'
+                return downloaded_path, None
+        except DownloadError as e:
+            return None, str(e)
+    
+    # Bound the whole run like the subprocess timeout does. A daemon thread is
+    # used so a stuck extractor can't keep the process alive after we give up.
+    outcome = []
+    errors = []
+    
+    def _target():
+        try:
+            outcome.append(_run())
+        except Exception as e:
+            errors.append(e)
+    
+    worker = threading.Thread(target=_target, name='ytdlp', daemon=True)
+    worker.start()
+    worker.join(YTDLP_TIMEOUT)
+    if worker.is_alive():
+        raise TimeoutError(f"yt-dlp did not finish within {YTDLP_TIMEOUT} seconds")
+    if errors:
+        raise errors[0]
+    return outcome[0]
+
+def run_ytdlp_subprocess(music_search_url, output_template):
+    """
+    Download by spawning the yt-dlp CLI (kept for compatibility).
+    Returns (downloaded_path, error_details).
+    """
+    cmd = [
+        sys.executable, '-m', 'yt_dlp',
+        '-f', 'bestaudio[ext=m4a]/bestaudio',  # Prefer m4a (better quality than webm)
+        '--no-post-overwrites',
+        '--no-warnings',  # Suppress warning messages
+        '--no-playlist',  # Don't download playlists (in case URL is a playlist)
+        '--quiet',  # Quiet mode - suppress all output except errors
+        '--playlist-items', '1',  # Only download first result
+        '--print', 'after_move:filepath',  # Print final file path on stdout
+        '-o', output_template,
+        music_search_url  # Direct YouTube Music search URL
+    ]
+    
+    # stdout only carries the --print path (--quiet), so just keep the stderr tail
+    result = subprocess.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        timeout=YTDLP_TIMEOUT
+    )
+    
+    # yt-dlp prints the final path of the downloaded file as its last line
+    output_lines = [line for line in result.stdout.splitlines() if line.strip()]
+    downloaded_path = output_lines[-1].strip() if output_lines else None
+    
+    if result.returncode == 0 and downloaded_path:
+        return downloaded_path, None
+    return None, result.stderr[-2000:]
+
+def download_with_ytdlp(search_query, output_dir, use_consistent_naming=False, use_subprocess=False):
     """
     Download using yt-dlp from YouTube Music exclusively.
     Uses direct YouTube Music search URL: https://music.youtube.com/search?q=<query>
     Prefers m4a format (AAC audio) for better quality.
     Downloads best audio without conversion - NO FFmpeg needed!
+    Runs yt-dlp in-process unless use_subprocess is set.
     """
     try:
         # Determine output template
@@ -136,86 +305,58 @@ def download_with_ytdlp(search_query, output_dir, use_consistent_naming=False):
         # Format: https://music.youtube.com/search?q=<query>
         music_search_url = f"https://music.youtube.com/search?q={urllib.parse.quote(search_query)}"
         
-        cmd = [
-            sys.executable, '-m', 'yt_dlp',
-            '-f', 'bestaudio[ext=m4a]/bestaudio',  # Prefer m4a (better quality than webm)
-            '--no-post-overwrites',
-            '--no-warnings',  # Suppress warning messages
-            '--no-playlist',  # Don't download playlists (in case URL is a playlist)
-            '--quiet',  # Quiet mode - suppress all output except errors
-            '--progress',  # But still show progress (optional, remove if you want completely silent)
-            '--playlist-items', '1',  # Only download first result
-            '-o', output_template,
-            music_search_url  # Direct YouTube Music search URL
-        ]
-        
         print(f"Downloading via yt-dlp (YouTube Music): {search_query}", file=sys.stderr)
         
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            timeout=180
-        )
+        if use_subprocess:
+            downloaded_path, details = run_ytdlp_subprocess(music_search_url, output_template)
+        else:
+            downloaded_path, details = run_ytdlp_in_process(music_search_url, output_template)
         
-        if result.returncode == 0:
-            # Find the downloaded file (might be .webm, .m4a, .opus, etc.)
-            audio_extensions = ['.webm', '.m4a', '.opus', '.mp3', '.aac']
-            
+        if downloaded_path:
             if use_consistent_naming:
-                # Find the temp file
-                temp_files = [f for f in os.listdir(output_dir) 
-                            if f.startswith('temp_download') and any(f.endswith(ext) for ext in audio_extensions)]
-                if temp_files:
-                    temp_file = temp_files[0]
-                    file_ext = os.path.splitext(temp_file)[1]
-                    
-                    # Rename previous latest to previous
-                    for ext in audio_extensions:
-                        latest_path = os.path.join(output_dir, f'latest{ext}')
-                        previous_path = os.path.join(output_dir, f'previous{ext}')
-                        
-                        if os.path.exists(latest_path):
-                            # Remove old previous if exists
-                            if os.path.exists(previous_path):
-                                os.remove(previous_path)
-                            # Rename latest to previous
-                            os.rename(latest_path, previous_path)
-                            print(f"Moved {os.path.basename(latest_path)} to previous{ext}", file=sys.stderr)
-                    
-                    # Rename temp to latest
-                    latest_path = os.path.join(output_dir, f'latest{file_ext}')
-                    temp_path = os.path.join(output_dir, temp_file)
-                    os.rename(temp_path, latest_path)
-                    print(f"Saved as latest{file_ext}", file=sys.stderr)
-                    
-                    return {
-                        'success': True,
-                        'file': f'latest{file_ext}',
-                        'path': latest_path
-                    }
+                file_ext = os.path.splitext(downloaded_path)[1]
+                
+                # List the folder once instead of probing every latest/previous name
+                with os.scandir(output_dir) as it:
+                    existing_files = {entry.name for entry in it}
+                
+                # Rename previous latest to previous
+                for ext in AUDIO_EXTS:
+                    if f'latest{ext}' in existing_files:
+                        # os.replace overwrites any old previous file atomically
+                        os.replace(
+                            os.path.join(output_dir, f'latest{ext}'),
+                            os.path.join(output_dir, f'previous{ext}')
+                        )
+                        print(f"Moved latest{ext} to previous{ext}", file=sys.stderr)
+                
+                # Rename temp to latest
+                latest_path = os.path.join(output_dir, f'latest{file_ext}')
+                os.replace(downloaded_path, latest_path)
+                print(f"Saved as latest{file_ext}", file=sys.stderr)
+                
+                return {
+                    'success': True,
+                    'file': f'latest{file_ext}',
+                    'path': latest_path
+                }
             else:
-                files = [f for f in os.listdir(output_dir) 
-                        if any(f.endswith(ext) for ext in audio_extensions)]
-                if files:
-                    return {
-                        'success': True,
-                        'file': files[-1],  # Most recent file
-                        'path': os.path.join(output_dir, files[-1])
-                    }
+                return {
+                    'success': True,
+                    'file': os.path.basename(downloaded_path),
+                    'path': downloaded_path
+                }
         
         return {
             'success': False,
             'error': 'Download failed',
-            'details': result.stderr
+            'details': details
         }
-    except subprocess.TimeoutExpired:
-        print("yt-dlp timed out after 180 seconds", file=sys.stderr)
+    except (subprocess.TimeoutExpired, TimeoutError):
+        print(f"yt-dlp timed out after {YTDLP_TIMEOUT} seconds", file=sys.stderr)
         return {
             'success': False,
-            'error': 'Download timed out (>180s)'
+            'error': f'Download timed out (>{YTDLP_TIMEOUT}s)'
         }
     except Exception as e:
         print(f"yt-dlp exception: {str(e)}", file=sys.stderr)
@@ -225,27 +366,53 @@ def download_with_ytdlp(search_query, output_dir, use_consistent_naming=False):
         }
 
 def main():
-    if len(sys.argv) < 3:
+    # --subprocess runs yt-dlp as a separate process instead of in-process
+    use_subprocess = '--subprocess' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != '--subprocess']
+    
+    if len(args) < 2:
         print(json.dumps({
             "success": False,
-            "error": "Usage: python download_spotify_song_simple.py <spotify_url> <output_folder> [use_consistent_naming]"
+            "error": "Usage: python download_spotify_song_simple.py <spotify_url> <output_folder> [use_consistent_naming] [--subprocess]"
         }))
         sys.exit(1)
     
-    spotify_url = sys.argv[1]
-    output_folder = sys.argv[2]
-    use_consistent_naming = len(sys.argv) > 3 and sys.argv[3].lower() == 'true'
+    spotify_url = args[0]
+    output_folder = args[1]
+    use_consistent_naming = len(args) > 2 and args[2].lower() == 'true'
     
     # Create output folder
     os.makedirs(output_folder, exist_ok=True)
     
-    # Get track info - Try API first for accurate data, fallback to oEmbed
-    print("Fetching track information...", file=sys.stderr)
-    track_info = extract_track_info_from_api(spotify_url)
+    # Get track info - Use cached metadata if seen before, otherwise
+    # try API first for accurate data, fallback to oEmbed
+    track_id = extract_track_id(spotify_url)
+    track_info = TRACK_CACHE.get(track_id) if track_id else None
     
-    if not track_info:
-        print("API fetch failed, trying oEmbed fallback...", file=sys.stderr)
-        track_info = extract_track_info_from_url(spotify_url)
+    if track_info:
+        print("Using cached track information", file=sys.stderr)
+    else:
+        # Both metadata sources are independent, so fetch them concurrently
+        # and warm up yt-dlp while waiting on the network
+        # (skipping the API when it isn't listening, and oEmbed without a track ID)
+        print("Fetching track information...", file=sys.stderr)
+        executor = ThreadPoolExecutor(max_workers=3)
+        api_future = executor.submit(extract_track_info_from_api, spotify_url) if api_available() else None
+        oembed_future = executor.submit(extract_track_info_from_url, spotify_url) if track_id else None
+        executor.submit(warmup_ytdlp, use_subprocess)
+        executor.shutdown(wait=False)
+        
+        track_info = api_future.result() if api_future else None
+        
+        # Only cache API results, so a track that falls back to oEmbed's
+        # single-artist metadata goes back to the API on the next run
+        if track_info and track_id:
+            TRACK_CACHE[track_id] = track_info
+            save_track_cache(TRACK_CACHE)
+        
+        if not track_info and oembed_future:
+            print("API fetch failed, trying oEmbed fallback...", file=sys.stderr)
+            track_info = oembed_future.result()
     
     if not track_info:
         print(json.dumps({
@@ -265,7 +432,7 @@ def main():
         print("Using consistent naming (latest/previous)", file=sys.stderr)
     
     # Download with yt-dlp
-    download_result = download_with_ytdlp(search_query, output_folder, use_consistent_naming)
+    download_result = download_with_ytdlp(search_query, output_folder, use_consistent_naming, use_subprocess)
     
     # Check if download was successful
     if download_result.get('success'):
@@ -9,29 +9,42 @@ Based on download_spotify_song_simple.py approach.
 import asyncio
 import json
 import os
+import re
 import sys
 import subprocess
 import tempfile
 import urllib.parse
-import urllib.request
 import io
 import shutil
 import logging
-from contextlib import asynccontextmanager
+import secrets
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
-from typing import Optional, Dict, Any, Union
-import traceback
+from typing import Optional, Dict, Any, Tuple, Union
 import time
 
+import aiohttp
+
+# Use orjson for faster response parsing when it is installed
+try:
+    import orjson as json_lib
+except ImportError:
+    json_lib = json
+
 # Import yt-dlp directly for better performance
 import yt_dlp
 from yt_dlp.utils import DownloadError, ExtractorError
 
-from fastapi import FastAPI, HTTPException, Request, Depends, Header
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Response, Depends, Header
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from starlette.status import HTTP_403_FORBIDDEN
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from mangum import Mangum
 
 # --- Configuration for Cookies ---
@@ -61,6 +74,21 @@ def get_cookie_file_path():
 
 COOKIE_FILE_PATH = get_cookie_file_path()
 
+# Spotify track IDs are 22-character base62 strings, found after "/track/"
+# in URLs or "spotify:track:" in URIs (longer runs of base62 are rejected)
+TRACK_ID_RE = re.compile(r'(?:/track/|spotify:track:)([A-Za-z0-9]{22})(?![A-Za-z0-9])')
+TRACK_ID_ONLY_RE = re.compile(r'[A-Za-z0-9]{22}')
+
+# Spotify oEmbed title formats, tried in order of precedence. Each alternative
+# captures the text before the first separator and up to the next one.
+TITLE_RE = re.compile(
+    r'(?P<dotted>.*?) · (?P<dotted_artist>.*?)(?: · |\Z)'
+    r'|(?P<quoted>.*?)" - (?P<quoted_artist>.*?)(?:" - |\Z)'
+    r'|(?P<dashed>.*?) - (?P<dashed_artist>.*?)(?: - |\Z)'
+    r'|(?P<by>.*?) by (?P<by_artist>.*?)(?: by |\Z)',
+    re.DOTALL
+)
+
 # --- Define Global API Key (Reads from Environment Variable) ---
 # For Windows local development: set API_SECRET_KEY=dev-local-key in PowerShell
 # For EC2 production: export API_SECRET_KEY="your-secure-key" in systemd service
@@ -68,6 +96,25 @@ API_SECRET_KEY = os.environ.get("API_SECRET_KEY", "dev-local-key")
 logger_setup = False  # Will be set to True after logging is configured
 # ---------------------------------------------------------------
 
+# --- Download concurrency limits ---
+# Worker threads running yt-dlp, and how many downloads may be in flight
+# (running + queued) before new requests are rejected with 503
+MAX_DOWNLOAD_WORKERS = int(os.environ.get("MAX_DOWNLOAD_WORKERS", "8"))
+MAX_PENDING_DOWNLOADS = int(os.environ.get("MAX_PENDING_DOWNLOADS", "16"))
+
+def get_download_temp_base_dir() -> Optional[str]:
+    """Pick where per-request download directories are created"""
+    # Opt-in override, e.g. DOWNLOAD_TMP_DIR=/dev/shm for RAM-backed tmpfs on
+    # hosts where it is sized for MAX_PENDING_DOWNLOADS concurrent downloads
+    override = os.environ.get("DOWNLOAD_TMP_DIR")
+    if override:
+        if os.path.isdir(override) and os.access(override, os.W_OK):
+            return override
+        logger.warning("DOWNLOAD_TMP_DIR %r is not a writable directory, using default", override)
+    if sys.platform == "win32":
+        return None  # Use default temp dir on Windows
+    return "/tmp"
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -78,11 +125,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_TEMP_BASE_DIR = get_download_temp_base_dir()
+
 # Force UTF-8 encoding for stdout/stderr to handle emojis on Windows
+# (only once, so module reloads don't stack wrappers on the same streams)
 if sys.platform == "win32":
-    import io
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+    if (getattr(sys.stdout, 'encoding', '') or '').lower() != 'utf-8':
+        sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    if (getattr(sys.stderr, 'encoding', '') or '').lower() != 'utf-8':
+        sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+def create_http_session() -> aiohttp.ClientSession:
+    """Create the pooled HTTP session shared by all metadata requests"""
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=10),
+        connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300)
+    )
+
+def create_download_workers(app: FastAPI) -> None:
+    """Create the dedicated yt-dlp thread pool and its running/in-flight download limits"""
+    app.state.dl_pool = ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS, thread_name_prefix='ytdlp')
+    # One slot per worker thread, so a job only starts its timeout once it is running
+    app.state.dl_run_sem = asyncio.Semaphore(MAX_DOWNLOAD_WORKERS)
+    app.state.dl_sem = asyncio.Semaphore(MAX_PENDING_DOWNLOADS)
 
 # Application lifespan manager
 @asynccontextmanager
@@ -90,10 +155,14 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Song Downloader API...")
     if not Path(COOKIE_FILE_PATH).exists():
-        logger.warning(f"Cookie file not found at: {COOKIE_FILE_PATH}. Downloads requiring login may fail.")
+        logger.warning("Cookie file not found at: %s. Downloads requiring login may fail.", COOKIE_FILE_PATH)
+    app.state.http = create_http_session()
+    create_download_workers(app)
     yield
     # Shutdown
     logger.info("Shutting down Song Downloader API...")
+    await app.state.http.close()
+    app.state.dl_pool.shutdown(wait=False, cancel_futures=True)
 
 app = FastAPI(
     title="Song Downloader API", 
@@ -120,7 +189,7 @@ async def get_api_key(x_api_key: str = Header(None)):
             detail="Authorization failed: X-API-KEY header missing"
         )
     if x_api_key != API_SECRET_KEY:
-        logger.warning(f"Invalid API key attempt: {x_api_key}")
+        logger.warning("Invalid API key attempt: %s", x_api_key)
         raise HTTPException(
             status_code=HTTP_403_FORBIDDEN, 
             detail="Invalid API Key"
@@ -128,6 +197,22 @@ async def get_api_key(x_api_key: str = Header(None)):
     # Success
     return x_api_key
 
+# Dependency providing the shared HTTP session
+async def get_http_session(request: Request) -> aiohttp.ClientSession:
+    """Returns the app-wide aiohttp session, creating it when lifespan is off (Lambda)."""
+    session = getattr(request.app.state, "http", None)
+    if session is None or session.closed:
+        session = create_http_session()
+        request.app.state.http = session
+    return session
+
+# Dependency providing the download worker pool and its limits
+async def get_download_workers(request: Request) -> Tuple[ThreadPoolExecutor, asyncio.Semaphore, asyncio.Semaphore]:
+    """Returns the yt-dlp pool, worker slots and in-flight limit, creating them when lifespan is off (Lambda)."""
+    if getattr(request.app.state, "dl_pool", None) is None:
+        create_download_workers(request.app)
+    return request.app.state.dl_pool, request.app.state.dl_run_sem, request.app.state.dl_sem
+
 # Error handling middleware
 @app.middleware("http")
 async def error_handling_middleware(request: Request, call_next):
@@ -141,7 +226,7 @@ async def error_handling_middleware(request: Request, call_next):
         return response
     except Exception as e:
         process_time = time.time() - start_time
-        logger.error(f"Unhandled error in {request.method} {request.url}: {str(e)}\n{traceback.format_exc()}")
+        logger.error("Unhandled error in %s %s: %s", request.method, request.url, e, exc_info=True)
         
         return JSONResponse(
             status_code=500,
@@ -175,15 +260,20 @@ class DownloadRequest(BaseModel):
     # Frontend metadata format
     metadata: Optional[Dict[str, Any]] = Field(None, description="Frontend metadata object")
     
-    def get_spotify_url(self) -> str:
+    # Resolved values are computed once per request and then cached
+    model_config = ConfigDict(ignored_types=(cached_property,))
+    
+    @cached_property
+    def resolved_spotify_url(self) -> str:
         """Get the Spotify URL from any available field"""
         url = self.spotify_url or self.song_url or self.url or self.trackUrl
-        # If no URL but trackId provided, construct URL
-        if not url and self.trackId:
+        # If no URL but a valid trackId provided, construct URL
+        if not url and self.trackId and TRACK_ID_ONLY_RE.fullmatch(self.trackId):
             url = f"https://open.spotify.com/track/{self.trackId}"
         return url
     
-    def get_track_name(self) -> str:
+    @cached_property
+    def resolved_track_name(self) -> str:
         """Get track name from any available field"""
         # Check metadata first (frontend format)
         if self.metadata and self.metadata.get('name'):
@@ -191,7 +281,8 @@ class DownloadRequest(BaseModel):
         
         return self.title or self.track_name or "Unknown"
     
-    def get_artist_name(self) -> str:
+    @cached_property
+    def resolved_artist_name(self) -> str:
         """Get artist name from any available field"""
         # Check metadata first (frontend format)
         if self.metadata and self.metadata.get('artist'):
@@ -199,7 +290,8 @@ class DownloadRequest(BaseModel):
         
         return self.artist or self.artist_name or "Unknown Artist"
     
-    def get_search_query(self) -> str:
+    @cached_property
+    def resolved_search_query(self) -> str:
         """Generate search query from available metadata"""
         # Check metadata first (frontend format)
         if self.metadata and self.metadata.get('searchQuery'):
@@ -208,8 +300,8 @@ class DownloadRequest(BaseModel):
         if self.search_query:
             return self.search_query
         
-        track = self.get_track_name()
-        artist = self.get_artist_name()
+        track = self.resolved_track_name
+        artist = self.resolved_artist_name
         
         # Clean up artist field (might contain multiple artists)
         if artist and "," in artist:
@@ -218,14 +310,18 @@ class DownloadRequest(BaseModel):
         
         return f"{track} {artist}".strip()
 
-class TrackInfo(BaseModel):
+# Internal result types (never parsed from the wire), so plain slotted
+# dataclasses are used instead of Pydantic models
+@dataclass(slots=True, frozen=True)
+class TrackInfo:
     name: str
     artists: list[str]
     search_query: str
     album: Optional[str] = None
     duration: Optional[str] = None
 
-class DownloadResult(BaseModel):
+@dataclass(slots=True)
+class DownloadResult:
     success: bool
     file_path: Optional[str] = None
     file_name: Optional[str] = None
@@ -237,53 +333,80 @@ class DownloadResult(BaseModel):
 class SpotifyTrackExtractor:
     """Handles Spotify track metadata extraction with multiple fallback methods"""
     
+    # Metadata cache shared by all requests: track_id -> (expires_at, TrackInfo).
+    # Spotify track metadata is effectively immutable, so entries live for an hour.
+    _cache: "OrderedDict[str, Tuple[float, TrackInfo]]" = OrderedDict()
+    cache_ttl = 3600
+    # oEmbed fallback results (single artist, often 'Unknown Artist') are only
+    # kept briefly, so the API's metadata replaces them once it is back
+    fallback_cache_ttl = 60
+    cache_max_size = 1024
+    
     @staticmethod
-    async def extract_from_api(spotify_url: str) -> Optional[TrackInfo]:
-        """Extract track info using local API endpoint with timeout"""
+    def extract_track_id(spotify_url: str) -> Optional[str]:
+        """Extract and validate the Spotify track ID from a track URL or URI"""
+        match = TRACK_ID_RE.search(spotify_url)
+        return match.group(1) if match else None
+    
+    async def extract(self, session: aiohttp.ClientSession, spotify_url: str) -> Tuple[Optional[TrackInfo], bool]:
+        """Extract track info via API or oEmbed, cached by track ID. Returns (track_info, cache_hit)"""
+        track_id = self.extract_track_id(spotify_url)
+        
+        if track_id:
+            cached = self._cache.get(track_id)
+            if cached and cached[0] > time.monotonic():
+                self._cache.move_to_end(track_id)
+                return cached[1], True
+        
+        # Start oEmbed alongside the API so the fallback is ready if needed,
+        # but keep the API's richer metadata whenever it succeeds
+        oembed_task = asyncio.ensure_future(self.extract_from_oembed(session, spotify_url))
+        ttl = self.cache_ttl
         try:
-            # Fallback to urllib if aiohttp is not available
-            try:
-                import aiohttp
-                api_url = f"http://localhost:3000/api/spotify/track-metadata?url={urllib.parse.quote(spotify_url)}"
-                
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
-                    async with session.get(api_url) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            
-                            if 'error' not in data:
-                                return TrackInfo(
-                                    name=data.get('name', 'Unknown'),
-                                    artists=data.get('artists', ['Unknown Artist']),
-                                    search_query=data.get('searchQuery', f"{data.get('name', 'Unknown')} {data.get('artists', ['Unknown'])[0]}")
-                                )
-            except ImportError:
-                # Fallback to synchronous urllib
-                api_url = f"http://localhost:3000/api/spotify/track-metadata?url={urllib.parse.quote(spotify_url)}"
-                
-                with urllib.request.urlopen(api_url, timeout=10) as response:
-                    data = json.loads(response.read().decode('utf-8'))
+            track_info = await self.extract_from_api(session, spotify_url)
+            if track_info is None:
+                track_info = await oembed_task
+                ttl = self.fallback_cache_ttl
+        finally:
+            if not oembed_task.done():
+                oembed_task.cancel()
+        
+        if track_info and track_id:
+            self._cache[track_id] = (time.monotonic() + ttl, track_info)
+            self._cache.move_to_end(track_id)
+            while len(self._cache) > self.cache_max_size:
+                self._cache.popitem(last=False)
+        
+        return track_info, False
+    
+    async def extract_from_api(self, session: aiohttp.ClientSession, spotify_url: str) -> Optional[TrackInfo]:
+        """Extract track info using local API endpoint over the shared session"""
+        try:
+            api_url = f"http://localhost:3000/api/spotify/track-metadata?url={urllib.parse.quote(spotify_url)}"
+            
+            async with session.get(api_url) as response:
+                if response.status == 200:
+                    data = json_lib.loads(await response.read())
                     
                     if 'error' not in data:
-                        return TrackInfo(
-                            name=data.get('name', 'Unknown'),
-                            artists=data.get('artists', ['Unknown Artist']),
-                            search_query=data.get('searchQuery', f"{data.get('name', 'Unknown')} {data.get('artists', ['Unknown'])[0]}")
-                        )
+                        name = data.get('name', 'Unknown')
+                        artists = data.get('artists', ['Unknown Artist'])
+                        search_query = data.get('searchQuery', f"{name} {artists[0] if artists else 'Unknown'}")
+                        
+                        # TrackInfo is a plain dataclass, so validate the payload here
+                        # and fall back to oEmbed rather than caching a bad result
+                        if (isinstance(name, str) and isinstance(search_query, str)
+                                and isinstance(artists, list) and artists
+                                and all(isinstance(artist, str) for artist in artists)):
+                            return TrackInfo(name=name, artists=artists, search_query=search_query)
+                        logger.warning("API returned malformed track metadata, ignoring")
         except Exception as e:
-            logger.warning(f"Failed to fetch from API: {e}")
+            logger.warning("Failed to fetch from API: %s", e)
         return None
     
-    @staticmethod
-    def extract_from_oembed(spotify_url: str) -> Optional[TrackInfo]:
-        """Extract track info using Spotify oEmbed API"""
-        track_id = None
-        
-        # Extract track ID from URL
-        if "/track/" in spotify_url:
-            track_id = spotify_url.split("/track/")[1].split("?")[0]
-        elif "spotify:track:" in spotify_url:
-            track_id = spotify_url.split("spotify:track:")[1]
+    async def extract_from_oembed(self, session: aiohttp.ClientSession, spotify_url: str) -> Optional[TrackInfo]:
+        """Extract track info using Spotify oEmbed API over the shared session"""
+        track_id = self.extract_track_id(spotify_url)
         
         if not track_id:
             return None
@@ -291,8 +414,9 @@ class SpotifyTrackExtractor:
         try:
             oembed_url = f"https://open.spotify.com/oembed?url=https://open.spotify.com/track/{track_id}"
             
-            with urllib.request.urlopen(oembed_url, timeout=10) as response:
-                data = json.loads(response.read().decode('utf-8'))
+            async with session.get(oembed_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                response.raise_for_status()
+                data = json_lib.loads(await response.read())
                 
                 title = data.get('title', '').strip()
                 track_name = 'Unknown'
@@ -300,20 +424,17 @@ class SpotifyTrackExtractor:
                 
                 if title:
                     # Enhanced parsing for different Spotify oEmbed title formats
-                    if ' · ' in title:
-                        parts = title.split(' · ')
-                        track_name, artist = parts[0], parts[1] if len(parts) > 1 else 'Unknown Artist'
-                    elif '" - ' in title:
-                        parts = title.split('" - ')
-                        track_name, artist = parts[0].strip('"'), parts[1] if len(parts) > 1 else 'Unknown Artist'
-                    elif ' - ' in title:
-                        parts = title.split(' - ')
-                        track_name, artist = parts[0], parts[1] if len(parts) > 1 else 'Unknown Artist'
-                    elif ' by ' in title:
-                        parts = title.split(' by ')
-                        track_name, artist = parts[0], parts[1] if len(parts) > 1 else 'Unknown Artist'
-                    else:
+                    match = TITLE_RE.match(title)
+                    if match is None:
                         track_name = title
+                    elif match['dotted'] is not None:
+                        track_name, artist = match['dotted'], match['dotted_artist']
+                    elif match['quoted'] is not None:
+                        track_name, artist = match['quoted'].strip('"'), match['quoted_artist']
+                    elif match['dashed'] is not None:
+                        track_name, artist = match['dashed'], match['dashed_artist']
+                    else:
+                        track_name, artist = match['by'], match['by_artist']
                 
                 # Clean up extracted data
                 track_name = track_name if track_name.lower() != 'unknown' else 'Unknown'
@@ -325,16 +446,67 @@ class SpotifyTrackExtractor:
                     search_query=f"{track_name} {artist}"
                 )
         except Exception as e:
-            logger.warning(f"Failed to fetch from Spotify oEmbed: {e}")
+            logger.warning("Failed to fetch from Spotify oEmbed: %s", e)
         return None
 
 
+# Static parts of the yt-dlp commands, built once at import time
+YTDLP_DOWNLOAD_ARGS = (
+    sys.executable, '-m', 'yt_dlp',
+    '-f', 'bestaudio/best',  # Simple, reliable format
+    '--no-post-overwrites',
+    '--no-playlist',
+    '--playlist-items', '1',  # Only download first result
+    '--socket-timeout', '120',
+    '--retries', '2',
+    '--print', 'video:webpage_url',  # Report the resolved video URL once the search is done
+    '--print', 'after_move:filepath',  # Report the final file path on stdout
+)
+
+YTDLP_FALLBACK_ARGS = (
+    sys.executable, '-m', 'yt_dlp',
+    '-f', 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
+    '--no-post-overwrites',
+    '--no-playlist',
+    '--playlist-items', '1',
+    '--socket-timeout', '180',
+    '--retries', '3',
+    '--fragment-retries', '2',
+    '--geo-bypass',
+    '--user-agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    '--print', 'after_move:filepath',
+)
+
+# MIME types for the audio formats yt-dlp may produce
+AUDIO_CONTENT_TYPES = {
+    '.m4a': 'audio/mp4',
+    '.webm': 'audio/webm',
+    '.opus': 'audio/opus',
+    '.mp3': 'audio/mpeg',
+    '.aac': 'audio/aac',
+    '.mp4': 'audio/mp4'
+}
+AUDIO_EXTENSIONS = tuple(AUDIO_CONTENT_TYPES)
+
+
 class YtDlpDownloader:
     """Production-ready yt-dlp wrapper using subprocess calls to mimic shell environment"""
     
-    def __init__(self):
+    def __init__(self, executor: Optional[ThreadPoolExecutor] = None, worker_slots: Optional[asyncio.Semaphore] = None):
         # Store cookie file path for subprocess calls
         self.cookie_file = COOKIE_FILE_PATH
+        # Dedicated pool for the blocking yt-dlp runs (None uses the loop default),
+        # and a semaphore sized to its workers so jobs never queue inside the pool
+        self.executor = executor
+        self.worker_slots = worker_slots
+    
+    async def _run_in_worker(self, func, timeout: float):
+        """Run a blocking job in the pool, starting its timeout only once a worker is free"""
+        async with self.worker_slots or nullcontext():
+            return await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(self.executor, func),
+                timeout=timeout
+            )
     
     async def download_audio(self, search_query: str, output_dir: str) -> DownloadResult:
         """Download audio using yt-dlp subprocess with async support"""
@@ -346,34 +518,24 @@ class YtDlpDownloader:
             
             # Use YouTube Music search URL (same as what worked in terminal)
             music_search_url = f"https://music.youtube.com/search?q={urllib.parse.quote(search_query)}"
-            logger.info(f"Starting YouTube Music search: {music_search_url}")
+            logger.info("Starting YouTube Music search: %s", music_search_url)
             
             # Build yt-dlp command (optimized for reliability)
-            cmd = [
-                sys.executable, '-m', 'yt_dlp',
-                '-f', 'bestaudio/best',  # Simple, reliable format
-                '--no-post-overwrites',
-                '--no-playlist',
-                '--playlist-items', '1',  # Only download first result
-                '--socket-timeout', '120',
-                '--retries', '2',
-                '-o', output_template,
-                music_search_url
-            ]
+            cmd = [*YTDLP_DOWNLOAD_ARGS, '-o', output_template, music_search_url]
             
             # Add cookies if file exists
             if Path(self.cookie_file).exists():
                 cmd.extend(['--cookies', self.cookie_file])
-                logger.info(f"Using cookies from: {self.cookie_file}")
+                logger.info("Using cookies from: %s", self.cookie_file)
             else:
-                logger.warning(f"Cookie file not found: {self.cookie_file}")
+                logger.warning("Cookie file not found: %s", self.cookie_file)
             
-            logger.info(f"Executing yt-dlp command: {' '.join(cmd)}")
+            logger.info("Executing yt-dlp command: %s", ' '.join(cmd))
             
-            # Use thread executor for non-blocking subprocess execution
-            loop = asyncio.get_event_loop()
+            video_url = None
             
             def _download():
+                nonlocal video_url
                 try:
                     result = subprocess.run(
                         cmd,
@@ -388,22 +550,20 @@ class YtDlpDownloader:
                     if result.returncode == 0:
                         logger.info("yt-dlp subprocess completed successfully")
                         if result.stdout:
-                            logger.info(f"yt-dlp stdout: {result.stdout[-500:]}")  # Last 500 chars
+                            logger.info("yt-dlp stdout: %s", result.stdout[-500:])  # Last 500 chars
                         
-                        # Find downloaded file
-                        audio_extensions = ['.m4a', '.webm', '.opus', '.mp3', '.aac', '.mp4']
-                        for file in Path(output_dir).iterdir():
-                            if file.is_file() and file.suffix.lower() in audio_extensions:
-                                logger.info(f"Successfully downloaded: {file.name}")
-                                return {
-                                    'file_path': str(file),
-                                    'file_name': file.name,
-                                    'file_size': file.stat().st_size,
-                                    'content_type': self._get_content_type(file.suffix)
-                                }
+                        file_info = self._get_downloaded_file(result.stdout, output_dir)
+                        if file_info:
+                            logger.info("Successfully downloaded: %s", file_info['file_name'])
+                            return file_info
                         
                         raise Exception("Download completed but no audio file found")
                     else:
+                        # Keep the resolved video URL so a retry can skip the search
+                        video_url = next(
+                            (line.strip() for line in result.stdout.splitlines() if line.startswith('http')),
+                            None
+                        )
                         error_msg = f"yt-dlp failed with return code {result.returncode}"
                         if result.stderr:
                             error_msg += f"\nStderr: {result.stderr}"
@@ -415,17 +575,15 @@ class YtDlpDownloader:
                 except subprocess.TimeoutExpired:
                     raise Exception("yt-dlp subprocess timed out after 120 seconds")
                 except Exception as e:
-                    logger.error(f"Subprocess execution failed: {str(e)}")
+                    logger.error("Subprocess execution failed: %s", e)
                     raise e
             
             # Execute with timeout
-            result = await asyncio.wait_for(
-                loop.run_in_executor(None, _download),
-                timeout=150.0  # Slightly longer than subprocess timeout
-            )
+            # Run in the worker pool for non-blocking subprocess execution
+            result = await self._run_in_worker(_download, timeout=150.0)  # Slightly longer than subprocess timeout
             
             download_time = time.time() - start_time
-            logger.info(f"Download completed in {download_time:.2f} seconds")
+            logger.info("Download completed in %.2f seconds", download_time)
             
             return DownloadResult(success=True, **result)
             
@@ -436,47 +594,33 @@ class YtDlpDownloader:
             
         except Exception as e:
             error_msg = f"Download error: {str(e)}"
-            logger.error(f"{error_msg}\n{traceback.format_exc()}")
+            logger.error("%s", error_msg, exc_info=True)
             
             # If download fails, try fallback approach
             if "403" in str(e) or "Forbidden" in str(e) or "HTTP Error 403" in str(e):
                 logger.info("Attempting fallback download with relaxed restrictions...")
                 try:
-                    return await self._fallback_download(search_query, output_dir)
+                    return await self._fallback_download(search_query, output_dir, video_url)
                 except Exception as fallback_error:
-                    logger.error(f"Fallback download also failed: {fallback_error}")
+                    logger.error("Fallback download also failed: %s", fallback_error)
             
             return DownloadResult(success=False, error=error_msg)
     
-    async def _fallback_download(self, search_query: str, output_dir: str) -> DownloadResult:
+    async def _fallback_download(self, search_query: str, output_dir: str, video_url: Optional[str] = None) -> DownloadResult:
         """Fallback download method with minimal restrictions using subprocess"""
         try:
             output_template = str(Path(output_dir) / '%(title)s.%(ext)s')
-            music_search_url = f"https://music.youtube.com/search?q={urllib.parse.quote(search_query)}"
+            # Reuse the video found by the first attempt instead of searching again
+            download_url = video_url or f"https://music.youtube.com/search?q={urllib.parse.quote(search_query)}"
             
             # Enhanced fallback command with format preferences
-            cmd = [
-                sys.executable, '-m', 'yt_dlp',
-                '-f', 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
-                '--no-post-overwrites',
-                '--no-playlist',
-                '--playlist-items', '1',
-                '--socket-timeout', '180',
-                '--retries', '3',
-                '--fragment-retries', '2',
-                '--geo-bypass',
-                '--user-agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                '-o', output_template,
-                music_search_url
-            ]
+            cmd = [*YTDLP_FALLBACK_ARGS, '-o', output_template, download_url]
             
             # Add cookies if available
             if Path(self.cookie_file).exists():
                 cmd.extend(['--cookies', self.cookie_file])
             
-            logger.info(f"Fallback command: {' '.join(cmd)}")
-            
-            loop = asyncio.get_event_loop()
+            logger.info("Fallback command: %s", ' '.join(cmd))
             
             def _fallback_download_sync():
                 result = subprocess.run(
@@ -490,16 +634,9 @@ class YtDlpDownloader:
                 )
                 
                 if result.returncode == 0:
-                    # Find downloaded file
-                    audio_extensions = ['.m4a', '.webm', '.opus', '.mp3', '.aac']
-                    for file in Path(output_dir).iterdir():
-                        if file.is_file() and file.suffix.lower() in audio_extensions:
-                            return {
-                                'file_path': str(file),
-                                'file_name': file.name,
-                                'file_size': file.stat().st_size,
-                                'content_type': self._get_content_type(file.suffix)
-                            }
+                    file_info = self._get_downloaded_file(result.stdout, output_dir)
+                    if file_info:
+                        return file_info
                     raise Exception("Fallback download: file not found")
                 else:
                     error_msg = f"Fallback failed with return code {result.returncode}"
@@ -507,29 +644,45 @@ class YtDlpDownloader:
                         error_msg += f"\nStderr: {result.stderr}"
                     raise Exception(error_msg)
             
-            result = await asyncio.wait_for(
-                loop.run_in_executor(None, _fallback_download_sync),
-                timeout=200.0
-            )
+            result = await self._run_in_worker(_fallback_download_sync, timeout=200.0)
             
             return DownloadResult(success=True, **result)
             
         except Exception as e:
-            logger.error(f"Fallback download failed: {str(e)}")
+            logger.error("Fallback download failed: %s", e)
             raise e
 
+    def _get_downloaded_file(self, stdout: str, output_dir: str) -> Optional[Dict[str, Any]]:
+        """Build file info from the path printed by yt-dlp's --print after_move:filepath"""
+        lines = [line.strip() for line in stdout.splitlines() if line.strip()]
+        if lines:
+            file = Path(lines[-1])
+            try:
+                return self._build_file_info(file, file.stat().st_size)
+            except OSError:
+                pass
+        
+        # Rare: no path was printed, or it vanished or could not be stat'ed.
+        # Fall back to the first audio file in the output directory
+        with os.scandir(output_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                    return self._build_file_info(Path(entry.path), entry.stat().st_size)
+        return None
+
+    def _build_file_info(self, file: Path, file_size: int) -> Dict[str, Any]:
+        """Describe a downloaded audio file for DownloadResult"""
+        return {
+            'file_path': str(file),
+            'file_name': file.name,
+            'file_size': file_size,
+            'content_type': self._get_content_type(file.suffix)
+        }
+
     @staticmethod
     def _get_content_type(file_extension: str) -> str:
         """Get MIME type for audio file extension"""
-        content_type_map = {
-            '.m4a': 'audio/mp4',
-            '.webm': 'audio/webm',
-            '.opus': 'audio/opus',
-            '.mp3': 'audio/mpeg',
-            '.aac': 'audio/aac',
-            '.mp4': 'audio/mp4'
-        }
-        return content_type_map.get(file_extension.lower(), 'audio/octet-stream')
+        return AUDIO_CONTENT_TYPES.get(file_extension.lower(), 'audio/octet-stream')
 
 
 
@@ -537,22 +690,27 @@ class YtDlpDownloader:
 @app.post("/api/spotify/download-song")
 async def download_song_frontend(
     request: DownloadRequest,
-    api_key: str = Depends(get_api_key)  # API Key validation required
+    api_key: str = Depends(get_api_key),  # API Key validation required
+    session: aiohttp.ClientSession = Depends(get_http_session),
+    download_workers: Tuple[ThreadPoolExecutor, asyncio.Semaphore, asyncio.Semaphore] = Depends(get_download_workers)
 ):
     """
     Production-ready frontend-compatible download endpoint. Requires X-API-KEY header.
     Returns audio blob directly with comprehensive error handling and performance optimization
     """
-    request_id = f"req_{int(time.time() * 1000)}"
-    logger.info(f"[{request_id}] Download request received - trackId: {request.trackId}, url: {request.get_spotify_url()}")
+    request_id = f"req_{secrets.token_hex(6)}"
+    spotify_url = request.resolved_spotify_url
+    track_name = request.resolved_track_name
+    artist_name = request.resolved_artist_name
+    logger.info("[%s] Download request received - trackId: %s, url: %s", request_id, request.trackId, spotify_url)
     
     start_time = time.time()
     temp_dir = None
+    download_slots: Optional[asyncio.Semaphore] = None
     
     try:
         # Input validation
-        spotify_url = request.get_spotify_url()
-        has_metadata = (request.get_track_name() != "Unknown") and (request.get_artist_name() != "Unknown Artist")
+        has_metadata = (track_name != "Unknown") and (artist_name != "Unknown Artist")
         
         if not spotify_url and not has_metadata:
             raise HTTPException(
@@ -560,43 +718,49 @@ async def download_song_frontend(
                 detail="Either Spotify URL/Track ID or complete track metadata (title + artist) is required"
             )
         
-        logger.info(f"[{request_id}] Input validation passed - URL: {spotify_url}, has_metadata: {has_metadata}")
+        logger.info("[%s] Input validation passed - URL: %s, has_metadata: %s", request_id, spotify_url, has_metadata)
+        
+        # Reject early when saturated, before creating temp dirs or fetching metadata.
+        # The slot is reserved in the same step (acquire() on an unlocked semaphore
+        # never suspends), so a burst can't all pass the check and then queue.
+        download_pool, worker_slots, pending_slots = download_workers
+        if pending_slots.locked():
+            raise HTTPException(
+                status_code=503,
+                detail="Too many downloads in progress, please retry shortly"
+            )
+        await pending_slots.acquire()
+        download_slots = pending_slots
         
         # Create secure temporary directory using OS-appropriate temp location
-        temp_base_dir = "/tmp" if sys.platform != "win32" else None  # Use default temp dir on Windows
-        temp_dir = tempfile.mkdtemp(prefix=f"song_dl_{request_id}_", dir=temp_base_dir)
-        logger.info(f"[{request_id}] Created temp directory: {temp_dir}")
+        temp_dir = tempfile.mkdtemp(prefix=f"song_dl_{request_id}_", dir=DOWNLOAD_TEMP_BASE_DIR)
+        logger.info("[%s] Created temp directory: %s", request_id, temp_dir)
         
         # Initialize services
         extractor = SpotifyTrackExtractor()
-        downloader = YtDlpDownloader()
+        downloader = YtDlpDownloader(download_pool, worker_slots)
         
         # Get track information
         track_info: Optional[TrackInfo] = None
+        cache_hit: Optional[bool] = None
         
         if has_metadata:
-            logger.info(f"[{request_id}] Using provided metadata")
-            artists = [a.strip() for a in request.get_artist_name().split(",")] if "," in request.get_artist_name() else [request.get_artist_name()]
+            logger.info("[%s] Using provided metadata", request_id)
+            artists = [a.strip() for a in artist_name.split(",")]
             
             track_info = TrackInfo(
-                name=request.get_track_name(),
+                name=track_name,
                 artists=artists,
-                search_query=request.get_search_query(),
+                search_query=request.resolved_search_query,
                 album=request.album,
                 duration=request.duration
             )
         else:
-            logger.info(f"[{request_id}] Extracting track info from Spotify URL")
+            logger.info("[%s] Extracting track info from Spotify URL", request_id)
             
-            # Try API first, then fallback to oEmbed
-            try:
-                track_info = await extractor.extract_from_api(spotify_url)
-            except Exception as e:
-                logger.warning(f"[{request_id}] API extraction failed: {e}")
-            
-            if not track_info:
-                logger.info(f"[{request_id}] Falling back to oEmbed extraction")
-                track_info = extractor.extract_from_oembed(spotify_url)
+            track_info, cache_hit = await extractor.extract(session, spotify_url)
+            if cache_hit:
+                logger.info("[%s] Using cached track info", request_id)
             
             if not track_info:
                 raise HTTPException(
@@ -604,10 +768,10 @@ async def download_song_frontend(
                     detail="Could not extract track information from Spotify URL"
                 )
         
-        logger.info(f"[{request_id}] Track info: {track_info.name} by {', '.join(track_info.artists)}")
+        logger.info("[%s] Track info: %s by %s", request_id, track_info.name, ', '.join(track_info.artists))
         
         # Download audio
-        logger.info(f"[{request_id}] Starting download with query: {track_info.search_query}")
+        logger.info("[%s] Starting download with query: %s", request_id, track_info.search_query)
         download_result = await downloader.download_audio(track_info.search_query, temp_dir)
         
         if not download_result.success:
@@ -618,93 +782,97 @@ async def download_song_frontend(
         
         # Prepare response
         file_path = Path(download_result.file_path)
-        if not file_path.exists():
+        try:
+            file_stat = file_path.stat()
+        except OSError:
             raise HTTPException(status_code=404, detail="Downloaded file not found")
         
-        # Read file content efficiently
-        file_content = file_path.read_bytes()
-        
         # Prepare headers
         # Prepare Content-Disposition header with UTF-8 filename support (RFC 5987)
-        from urllib.parse import quote
+        file_name = download_result.file_name
         ascii_filename = (
-            download_result.file_name.encode('ascii', 'ignore').decode('ascii')
-            if any(ord(c) > 127 for c in download_result.file_name)
-            else download_result.file_name
+            file_name if file_name.isascii()
+            else file_name.encode('ascii', 'ignore').decode('ascii')
         )
-        quoted_filename = quote(download_result.file_name)
+        quoted_filename = urllib.parse.quote(file_name)
         content_disposition = (
             f"attachment; filename=\"{ascii_filename}\"; filename*=UTF-8''{quoted_filename}"
         )
         headers = {
             "Content-Disposition": content_disposition,
-            "Content-Length": str(len(file_content)),
             "X-Track-Name": track_info.name,
             "X-Track-Artist": ", ".join(track_info.artists),
             "X-Request-Id": request_id,
             "X-Download-Time": f"{time.time() - start_time:.2f}s"
         }
         
+        if cache_hit is not None:
+            headers["X-Cache"] = "HIT" if cache_hit else "MISS"
         if track_info.album:
             headers["X-Track-Album"] = track_info.album
         if track_info.duration:
             headers["X-Track-Duration"] = track_info.duration
         
-        logger.info(f"[{request_id}] Download completed in {time.time() - start_time:.2f}s - Size: {len(file_content)} bytes")
-        
-        # Stream response efficiently
-        def iter_file_content():
-            chunk_size = 8192  # 8KB chunks
-            for i in range(0, len(file_content), chunk_size):
-                yield file_content[i:i + chunk_size]
+        logger.info("[%s] Download completed in %.2fs - Size: %s bytes", request_id, time.time() - start_time, file_stat.st_size)
         
-        return StreamingResponse(
-            iter_file_content(),
+        # FileResponse sends the file itself (zero-copy when the server supports
+        # it) and sets Content-Length. The temp directory must outlive the
+        # handler, so remove it once the response has been fully sent
+        response = FileResponse(
+            file_path,
             media_type=download_result.content_type,
-            headers=headers
+            headers=headers,
+            stat_result=file_stat,
+            background=BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
         )
+        temp_dir = None
+        return response
         
     except HTTPException:
         raise
     except asyncio.TimeoutError:
         error_msg = "Download operation timed out"
-        logger.error(f"[{request_id}] {error_msg}")
+        logger.error("[%s] %s", request_id, error_msg)
         raise HTTPException(status_code=504, detail=error_msg)
     except Exception as e:
         error_msg = f"Unexpected error: {str(e)}"
-        logger.error(f"[{request_id}] {error_msg}\n{traceback.format_exc()}")
+        logger.error("[%s] %s", request_id, error_msg, exc_info=True)
         raise HTTPException(status_code=500, detail=error_msg)
     finally:
         # Cleanup
+        if download_slots is not None:
+            download_slots.release()
         if temp_dir and Path(temp_dir).exists():
             try:
                 shutil.rmtree(temp_dir, ignore_errors=True)
-                logger.info(f"[{request_id}] Cleaned up temp directory")
+                logger.info("[%s] Cleaned up temp directory", request_id)
             except Exception as e:
-                logger.warning(f"[{request_id}] Failed to cleanup temp directory: {e}")
+                logger.warning("[%s] Failed to cleanup temp directory: %s", request_id, e)
 
 @app.get("/api/spotify/track-metadata")
-async def get_track_metadata(url: str):
+async def get_track_metadata(
+    url: str,
+    response: Response,
+    session: aiohttp.ClientSession = Depends(get_http_session)
+):
     """
     Get track metadata from Spotify URL with enhanced error handling
     """
-    request_id = f"meta_{int(time.time() * 1000)}"
-    logger.info(f"[{request_id}] Metadata request for URL: {url}")
+    request_id = f"meta_{secrets.token_hex(6)}"
+    logger.info("[%s] Metadata request for URL: %s", request_id, url)
     
     try:
         extractor = SpotifyTrackExtractor()
         
-        # Try API first
-        track_info = await extractor.extract_from_api(url)
-        
-        # Fallback to oEmbed
-        if not track_info:
-            track_info = extractor.extract_from_oembed(url)
+        # API first, with oEmbed prefetched as the fallback (served from cache when possible)
+        track_info, cache_hit = await extractor.extract(session, url)
         
         if not track_info:
             raise HTTPException(status_code=400, detail="Could not extract track metadata from URL")
         
-        logger.info(f"[{request_id}] Successfully extracted metadata: {track_info.name}")
+        response.headers["X-Cache"] = "HIT" if cache_hit else "MISS"
+        
+        logger.info("[%s] Successfully extracted metadata: %s", request_id, track_info.name)
         
         return {
             "name": track_info.name,
@@ -717,7 +885,7 @@ async def get_track_metadata(url: str):
         raise
     except Exception as e:
         error_msg = f"Error extracting metadata: {str(e)}"
-        logger.error(f"[{request_id}] {error_msg}")
+        logger.error("[%s] %s", request_id, error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
 